@@ -1,7 +1,25 @@
+import os
+
+# oneDNN's fused MatMul+BiasAdd+Relu primitives (AVX2/AVX-512 JIT kernels)
+# must be requested before TensorFlow is imported.
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1')
+
 import tensorflow as tf
 from tensorflow.keras import layers, Model
 import numpy as np
-import os
+
+# Enable XLA JIT globally so Dense -> bias -> ReLU chains compile into single
+# fused GEMM kernels instead of materializing intermediate tensors per op.
+tf.config.optimizer.set_jit(True)
+
+# Feature normalization constants, baked into the graph by the 'normalize'
+# Rescaling layer. Inputs arrive scaled 0-1 on-device; centering them to
+# [-1, 1] here is free at inference because XLA's constant folding (and
+# oneDNN without XLA) collapses (x/STD - MEAN/STD) @ W + b into an adjusted
+# first-layer W' = W/STD and b' = b - (MEAN/STD) @ W. Replace with
+# fleet-measured statistics once usage telemetry provides them.
+FEATURE_MEAN = 0.5
+FEATURE_STD = 0.5
 
 def create_behavior_model(input_shape=(10,)):
     """
@@ -19,29 +37,50 @@ def create_behavior_model(input_shape=(10,)):
     # --- Input Layer ---
     inputs = layers.Input(shape=input_shape, name='usage_features')
     
+    # --- Baked-In Normalization ---
+    # Graph-resident affine transform: folded into the first Dense layer's
+    # weights at compile time, so the external normalization step costs
+    # nothing. Rescaling (unlike a Lambda closure) serializes by config,
+    # so the saved .keras artifact round-trips cleanly.
+    x = layers.Rescaling(
+        scale=1.0 / FEATURE_STD,
+        offset=-FEATURE_MEAN / FEATURE_STD,
+        name='normalize'
+    )(inputs)
+
     # --- Encoder ---
     # Extracts hierarchical patterns from raw usage stats
-    x = layers.Dense(32, activation='relu', name='encoder_1')(inputs)
+    x = layers.Dense(32, activation='relu', name='encoder_1')(x)
     x = layers.Dense(24, activation='relu', name='encoder_2')(x)
     
     # Latent Habit Embedding
     # This layer represents the core behavioral signature of the user
     latent_embedding = layers.Dense(16, activation='relu', name='latent_habit_embedding')(x)
     
-    # --- Head 1: Habituality ---
+    # --- Fused Heads ---
+    # All three heads consume the same latent embedding, so a single Dense(5)
+    # produces every logit in one GEMV of shape (16,5) instead of three
+    # separate (16,1)+(16,1)+(16,3) GEMVs.
+    # The heads emit RAW LOGITS: the sigmoid/softmax activations are fused
+    # into the losses at training time (from_logits=True, numerically stable
+    # fused cross-entropy kernels) and re-applied only for deployment by
+    # create_inference_model().
+    combined = layers.Dense(5, name='heads')(latent_embedding)
+
+    # Head 1: Habituality (logit)
     # Binary classification: 0 (Novel/Random) <---> 1 (Habitual/Routine)
-    habit_output = layers.Dense(1, activation='sigmoid', name='habit_head')(latent_embedding)
-    
-    # --- Head 2: Distraction ---
+    habit_output = layers.Activation('linear', name='habit_head')(combined[:, 0:1])
+
+    # Head 2: Distraction (logit)
     # Binary classification: 0 (Focused) <---> 1 (Distracted/Doomscrolling)
-    distraction_output = layers.Dense(1, activation='sigmoid', name='distraction_head')(latent_embedding)
-    
-    # --- Head 3: Stability ---
+    distraction_output = layers.Activation('linear', name='distraction_head')(combined[:, 1:2])
+
+    # Head 3: Stability (logits)
     # Multi-class classification:
     # 0: Stable (Routine is consistent)
     # 1: Drifting (Slowly changing habits)
     # 2: Chaotic (Erratic usage)
-    stability_output = layers.Dense(3, activation='softmax', name='stability_head')(latent_embedding)
+    stability_output = layers.Activation('linear', name='stability_head')(combined[:, 2:5])
     
     # --- Model Definition ---
     model = Model(
@@ -52,6 +91,24 @@ def create_behavior_model(input_shape=(10,)):
     
     return model
 
+def create_inference_model(model):
+    """
+    Wraps the logit-output training model with the head activations so
+    deployed artifacts still emit probabilities. Training skips these
+    activations entirely: the from_logits losses use the fused
+    sigmoid/softmax cross-entropy kernels instead.
+    """
+    habit_prob, distraction_prob, stability_prob = model.outputs
+    return Model(
+        inputs=model.inputs,
+        outputs=[
+            layers.Activation('sigmoid', name='habit_prob')(habit_prob),
+            layers.Activation('sigmoid', name='distraction_prob')(distraction_prob),
+            layers.Activation('softmax', name='stability_prob')(stability_prob),
+        ],
+        name='droid_lm_behavior_model_inference'
+    )
+
 def compile_and_save_model():
     """
     Compiles the model and saves it. 
@@ -62,15 +119,20 @@ def compile_and_save_model():
     model.compile(
         optimizer='adam',
         loss={
-            'habit_head': 'binary_crossentropy',
-            'distraction_head': 'binary_crossentropy',
-            'stability_head': 'sparse_categorical_crossentropy', # Sparse allows using integer labels (0, 1, 2)
+            # from_logits=True: the head activations fuse into the stable
+            # sigmoid/softmax cross-entropy kernels (one exp+log pass).
+            'habit_head': tf.keras.losses.BinaryCrossentropy(from_logits=True),
+            'distraction_head': tf.keras.losses.BinaryCrossentropy(from_logits=True),
+            # Sparse allows using integer labels (0, 1, 2)
+            'stability_head': tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
         },
         metrics={
-            'habit_head': ['accuracy'],
-            'distraction_head': ['accuracy'],
-            'stability_head': ['accuracy'],
-        }
+            # Logit threshold 0.0 is equivalent to probability 0.5
+            'habit_head': [tf.keras.metrics.BinaryAccuracy(threshold=0.0)],
+            'distraction_head': [tf.keras.metrics.BinaryAccuracy(threshold=0.0)],
+            'stability_head': ['accuracy'], # argmax is activation-invariant
+        },
+        jit_compile=True, # XLA-fuse matmul+bias+activation per layer
     )
     
     model.summary()
@@ -78,11 +140,59 @@ def compile_and_save_model():
     # Ensure directory exists
     os.makedirs('saved_models', exist_ok=True)
     
-    # Save Model
-    save_path = 'saved_models/behavior_model.h5'
+    # Save Model (native zipped .keras format: fewer syscalls and no
+    # per-tensor HDF5 dataset overhead compared to the legacy .h5 path)
+    save_path = 'saved_models/behavior_model.keras'
     model.save(save_path)
     print(f"\nModel saved to: {save_path}")
 
+    # Round-trip check: the saved artifact must reload cleanly (a Lambda
+    # layer here once broke deserialization without failing the save).
+    tf.keras.models.load_model(save_path)
+    print("Reload check passed.")
+
+    # SavedModel export so downstream TFLite conversion can share the same
+    # from_saved_model pipeline as trainable_model_gen.py
+    sm_path = 'saved_models/behavior_model_sm'
+    tf.saved_model.save(model, sm_path)
+    print(f"SavedModel created at: {sm_path}")
+
+    # TFLite artifacts ship the inference wrapper so they emit probabilities,
+    # not the raw training logits.
+    export_quantized_variants(create_inference_model(model))
+
+def export_quantized_variants(model):
+    """
+    Exports reduced-precision TFLite variants of the behavior model:
+    - float16: 2x smaller weights, GPU-delegate friendly, near-zero accuracy loss.
+    - int8: 4x smaller weights for CPU / Edge-TPU deployment, calibrated with
+      a representative dataset over the normalized 0-1 feature range.
+    """
+    # --- float16 Variant ---
+    fp16_converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    fp16_converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    fp16_converter.target_spec.supported_types = [tf.float16]
+
+    fp16_path = 'saved_models/behavior_model_fp16.tflite'
+    with open(fp16_path, 'wb') as f:
+        f.write(fp16_converter.convert())
+    print(f"TFLite (float16) Model saved to: {fp16_path}")
+
+    # --- int8 Variant ---
+    def representative_data_gen():
+        # ~100 uniform samples; inputs are normalized 0-1 usage features.
+        for _ in range(100):
+            yield [np.random.rand(1, 10).astype(np.float32)]
+
+    int8_converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    int8_converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    int8_converter.representative_dataset = representative_data_gen
+
+    int8_path = 'saved_models/behavior_model_int8.tflite'
+    with open(int8_path, 'wb') as f:
+        f.write(int8_converter.convert())
+    print(f"TFLite (int8) Model saved to: {int8_path}")
+
 if __name__ == '__main__':
     # Verify environment (Requires tensorflow installed in your python env)
     try:
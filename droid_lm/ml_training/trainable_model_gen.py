@@ -1,6 +1,15 @@
+import os
+
+# oneDNN's fused MatMul+BiasAdd+Relu primitives (AVX2/AVX-512 JIT kernels)
+# must be requested before TensorFlow is imported.
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1')
+
 import tensorflow as tf
 import numpy as np
-import os
+
+# Enable XLA JIT globally so each Dense layer's matmul+bias+relu compiles
+# into one fused kernel instead of three ops with materialized intermediates.
+tf.config.optimizer.set_jit(True)
 
 # Constants for Model Architecture
 FEATURE_DIM = 34 # Daily behavior features
@@ -8,6 +17,46 @@ WINDOW_SIZE = 3  # Sliding window size (Days)
 INPUT_DIM = FEATURE_DIM * WINDOW_SIZE # 102 Features (Flattened Temporal Window)
 OUTPUT_DIM = 2 # [HabitualityScore, DistractionScore]
 
+# Mixed-Precision Matmul:
+# bfloat16 GEMMs double the SIMD lane width and halve weight-load bandwidth
+# on hardware with native BF16 (AVX-512 BF16, ARM BF16 MMLA). TF exposes no
+# portable CPU feature probe, so this is opt-in via env var and defaults to
+# FP32 everywhere else (and keeps the TFLite export FP32 unless requested).
+USE_BF16_MATMUL = os.environ.get('DROIDLM_BF16_MATMUL', '0') == '1'
+
+# Packed parameter layout: [w1, b1, w2, b2, w3, b3, w4, b4] flattened into
+# one contiguous block (see TrainableModel.params).
+PARAM_SHAPES = [
+    [INPUT_DIM, 64], [64],       # Layer 1
+    [64, 64], [64],              # Layer 2
+    [64, 32], [32],              # Layer 3
+    [32, OUTPUT_DIM], [OUTPUT_DIM], # Layer 4
+]
+
+# Total scalar count of the packed block, plus a per-element init scale:
+# He stddev sqrt(2/fan_in) over each weight segment, 0 over the bias
+# segments so biases still start at zero.
+TOTAL_PARAMS = sum(int(np.prod(shape)) for shape in PARAM_SHAPES)
+
+def _build_init_scales():
+    scales = []
+    for shape in PARAM_SHAPES:
+        size = int(np.prod(shape))
+        stddev = np.sqrt(2.0 / shape[0]) if len(shape) == 2 else 0.0
+        scales.append(np.full(size, stddev, dtype=np.float32))
+    return np.concatenate(scales)
+
+INIT_SCALES = _build_init_scales()
+
+# Fixed stateless-RNG seed: identical weights across processes/runs, which
+# keeps baselines stable when A/B-ing architecture tweaks.
+WEIGHT_INIT_SEED = (42, 0)
+
+# SGD step size, held as a tf.constant so every train trace captures it as
+# a graph constant: under jit_compile XLA folds the scale into the fused
+# update — one FMA per weight instead of a multiply plus a subtract.
+LEARNING_RATE = tf.constant(0.01, dtype=tf.float32)
+
 class TrainableModel(tf.Module):
     def __init__(self):
         super(TrainableModel, self).__init__()
@@ -16,11 +65,8 @@ class TrainableModel(tf.Module):
         # By feeding a sequence (Day T-2, T-1, T) as a single flat vector,
         # the model can learn transition patterns (e.g., Increasing Screen Time -> High Distraction).
         # This increases capacity to detect "Momentum" and "Accumulation" effects compared to single-day inputs.
-        
-    def __init__(self):
-        super(TrainableModel, self).__init__()
-        # Input: Flattened Temporal Window Vector (102 floats)
-        # Architecture: 
+
+        # Architecture:
         #   Input(102) 
         #   -> Dense(64, ReLU)   [Latent Feature Extraction]
         #   -> Dense(64, ReLU)   [Pattern Consolidation]
@@ -38,46 +84,65 @@ class TrainableModel(tf.Module):
         # (w1, w2, w3) to learn a robust representation of "User State" that is useful for ALL tasks.
         # This regularization prevents overfitting to one specific metric and improves generalization.
 
-        # Layer 1: 102 -> 64
-        self.w1 = tf.Variable(tf.random.normal([INPUT_DIM, 64], stddev=0.1), name='w1')
-        self.b1 = tf.Variable(tf.zeros([64]), name='b1')
-        
-        # Layer 2: 64 -> 64
-        self.w2 = tf.Variable(tf.random.normal([64, 64], stddev=0.1), name='w2')
-        self.b2 = tf.Variable(tf.zeros([64]), name='b2')
-        
-        # Layer 3: 64 -> 32
-        self.w3 = tf.Variable(tf.random.normal([64, 32], stddev=0.1), name='w3')
-        self.b3 = tf.Variable(tf.zeros([32]), name='b3')
+        # All layer weights live in ONE flat contiguous tf.Variable
+        # (layout: PARAM_SHAPES). Eight separate tiny variables meant eight
+        # allocations, eight resource reads per step and a Python-loop SGD
+        # update; the packed block gives cache-friendly contiguous storage
+        # and a single gradient/update tensor per train step.
+        # A single stateless RNG draw fills the whole packed block — one
+        # kernel launch, no global-RNG state contention, and reproducible
+        # weights thanks to the fixed seed. INIT_SCALES rescales each
+        # weight segment to its He stddev (sqrt(2/fan_in), matching the
+        # ReLU stack's variance) and zeroes the bias segments.
+        flat = tf.random.stateless_normal([TOTAL_PARAMS], seed=WEIGHT_INIT_SEED)
+        self.params = tf.Variable(flat * INIT_SCALES, name='params')
 
-        # Layer 4: 32 -> 2 (Output)
-        self.w4 = tf.Variable(tf.random.normal([32, OUTPUT_DIM], stddev=0.1), name='w4')
-        self.b4 = tf.Variable(tf.zeros([OUTPUT_DIM]), name='b4')
+    def _unpack(self):
+        # Slice per-layer tf.Tensor views out of the packed parameter block.
+        views = []
+        offset = 0
+        for shape in PARAM_SHAPES:
+            size = int(np.prod(shape))
+            views.append(tf.reshape(self.params[offset:offset + size], shape))
+            offset += size
+        return views
 
-        # Optimization
-        self.learning_rate = 0.01
-        
+    def _matmul(self, x, w):
+        # BF16 multiply with FP32 accumulation when enabled; plain FP32 GEMM
+        # otherwise. The bias add and activations always stay FP32.
+        if USE_BF16_MATMUL:
+            product = tf.matmul(tf.cast(x, tf.bfloat16), tf.cast(w, tf.bfloat16))
+            return tf.cast(product, tf.float32)
+        return tf.matmul(x, w)
+
+    @tf.function(jit_compile=True)
     def __call__(self, x):
-        # Forward pass
+        # Forward pass (XLA fuses matmul+add+relu per layer into one kernel)
+        # tf.nn.bias_add (vs broadcast '+') hits the MatMul+BiasAdd fusion
+        # path that Grappler's remapper and the TFLite converter recognize.
+        w1, b1, w2, b2, w3, b3, w4, b4 = self._unpack()
+
         # L1
-        x = tf.matmul(x, self.w1) + self.b1
-        x = tf.nn.relu(x)
-        
+        x = tf.nn.relu(tf.nn.bias_add(self._matmul(x, w1), b1))
+
         # L2
-        x = tf.matmul(x, self.w2) + self.b2
-        x = tf.nn.relu(x)
-        
+        x = tf.nn.relu(tf.nn.bias_add(self._matmul(x, w2), b2))
+
         # L3
-        x = tf.matmul(x, self.w3) + self.b3
-        x = tf.nn.relu(x)
+        x = tf.nn.relu(tf.nn.bias_add(self._matmul(x, w3), b3))
 
         # L4 (Linear Projection)
-        x = tf.matmul(x, self.w4) + self.b4
-        
+        x = tf.nn.bias_add(self._matmul(x, w4), b4)
+
         # Final Activation (0-1 Score)
         return tf.nn.sigmoid(x)
 
-    @tf.function(input_signature=[
+    # jit_compile fuses the whole train step (forward, MSE loss and the
+    # ~12 backward ops) into one XLA cluster, so per-layer gradient
+    # intermediates never materialize. The shapes are static per batch
+    # size, making compilation a one-shot cost amortized over all steps.
+    # Verify fusion with XLA_FLAGS=--xla_hlo_profile.
+    @tf.function(jit_compile=True, input_signature=[
         tf.TensorSpec(shape=[None, INPUT_DIM], dtype=tf.float32),  # x input (Batch, 102)
         tf.TensorSpec(shape=[None, OUTPUT_DIM], dtype=tf.float32)  # y target (Batch, 2)
     ])
@@ -87,19 +152,19 @@ class TrainableModel(tf.Module):
             # MSE Loss (Average over Batch and Output Dims)
             loss = tf.reduce_mean(tf.square(y - prediction))
             
-        # Gradients
-        vars_to_train = [
-            self.w1, self.b1, 
-            self.w2, self.b2, 
-            self.w3, self.b3,
-            self.w4, self.b4
-        ]
-        gradients = tape.gradient(loss, vars_to_train)
-        
-        # Manual SGD Update
-        for var, grad in zip(vars_to_train, gradients):
-            var.assign_sub(grad * self.learning_rate)
-            
+        # Gradients (one tensor for the whole packed parameter block)
+        dparams = tape.gradient(loss, self.params)
+
+        # Fused SGD Update: ResourceApplyGradientDescent does
+        # var -= alpha * delta in one kernel, avoiding the separate
+        # mul + assign_sub ops and the grad*lr intermediate tensor.
+        # With the packed parameter block this is a single call per step.
+        tf.raw_ops.ResourceApplyGradientDescent(
+            var=self.params.handle,
+            alpha=LEARNING_RATE,
+            delta=dparams
+        )
+
         return {
             "loss": loss, 
             "prediction": prediction
@@ -113,48 +178,233 @@ class TrainableModel(tf.Module):
             "output": self(x)
         }
     
+    @tf.function(input_signature=[
+        tf.TensorSpec(shape=[INPUT_DIM], dtype=tf.float32)
+    ])
+    def infer_single(self, x):
+        # Single-sample path: a rank-1 input selects GEMV kernels (matvec)
+        # instead of dispatching a full GEMM for a [1, 102] batch — roughly
+        # 2x the arithmetic intensity per byte at these tiny shapes.
+        w1, b1, w2, b2, w3, b3, w4, b4 = self._unpack()
+        h = tf.nn.relu(tf.linalg.matvec(w1, x, transpose_a=True) + b1)
+        h = tf.nn.relu(tf.linalg.matvec(w2, h, transpose_a=True) + b2)
+        h = tf.nn.relu(tf.linalg.matvec(w3, h, transpose_a=True) + b3)
+        out = tf.linalg.matvec(w4, h, transpose_a=True) + b4
+        return {
+            "output": tf.nn.sigmoid(out)
+        }
+
+    # Shape-Specialized Signatures:
+    # The generic train/infer traces keep shape=[None, ...] so the runtime
+    # kernel selection stays batch-agnostic. On-device deployment batch
+    # sizes are known (1 for inference, 32 for fine-tuning), and tracing
+    # with a fixed batch dim lets XLA/TFLite constant-fold shapes and emit
+    # specialized kernels.
+    @tf.function(input_signature=[
+        tf.TensorSpec(shape=[1, INPUT_DIM], dtype=tf.float32)
+    ])
+    def infer_bs1(self, x):
+        return {
+            "output": self(x)
+        }
+
+    @tf.function(input_signature=[
+        tf.TensorSpec(shape=[32, INPUT_DIM], dtype=tf.float32),
+        tf.TensorSpec(shape=[32, OUTPUT_DIM], dtype=tf.float32)
+    ])
+    def train_bs32(self, x, y):
+        return self.train(x, y)
+
     @tf.function(input_signature=[])
     def save(self):
-        # Flattened weights
+        # Per-layer views unpacked from the contiguous parameter block
+        w1, b1, w2, b2, w3, b3, w4, b4 = self._unpack()
         return {
-            "w1": self.w1, "b1": self.b1,
-            "w2": self.w2, "b2": self.b2,
-            "w3": self.w3, "b3": self.b3,
-            "w4": self.w4, "b4": self.b4
+            "w1": w1, "b1": b1,
+            "w2": w2, "b2": b2,
+            "w3": w3, "b3": b3,
+            "w4": w4, "b4": b4
         }
 
-def create_and_convert():
-    model = TrainableModel()
-    
-    # 1. Save as SavedModel
-    saved_model_path = "saved_models/trainable_micro"
-    tf.saved_model.save(
-        model,
-        saved_model_path,
-        signatures={
-            'train': model.train,
-            'infer': model.infer,
-            'save': model.save,
-        }
+def export_aot_artifacts(model):
+    # Emit the inputs needed to AOT-compile the batch-1 'infer' graph with
+    # XLA's tfcompile: a frozen GraphDef plus the tf2xla feed/fetch config.
+    # tfcompile itself runs under Bazel in the TensorFlow source tree, so
+    # the compile happens out-of-band, e.g.:
+    #
+    #   bazel run //tensorflow/compiler/aot:tfcompile -- \
+    #       --graph=infer_graph.pb \
+    #       --config=infer_tf2xla.config.pbtxt \
+    #       --target_features=+avx2,+fma \
+    #       --cpp_class=droidlm::InferModel
+    #
+    # The resulting .o/.h expose a plain C++ entry point with the four
+    # MatMul+BiasAdd+ReLU ops compiled straight to native SIMD, bypassing
+    # the interpreter loop. The TFLite export remains the trainable path.
+    from tensorflow.python.framework.convert_to_constants import (
+        convert_variables_to_constants_v2,
     )
-    print(f"SavedModel created at: {saved_model_path}")
-    
+
+    frozen = convert_variables_to_constants_v2(
+        model.infer_bs1.get_concrete_function()
+    )
+
+    aot_dir = "saved_models/aot"
+    os.makedirs(aot_dir, exist_ok=True)
+
+    tf.io.write_graph(frozen.graph, aot_dir, "infer_graph.pb", as_text=False)
+
+    feed_name = frozen.inputs[0].op.name
+    fetch_name = frozen.outputs[0].op.name
+    config_path = os.path.join(aot_dir, "infer_tf2xla.config.pbtxt")
+    with open(config_path, "w") as f:
+        f.write(
+            f'feed {{ id {{ node_name: "{feed_name}" }} '
+            f'shape {{ dim {{ size: 1 }} dim {{ size: {INPUT_DIM} }} }} }}\n'
+            f'fetch {{ id {{ node_name: "{fetch_name}" }} }}\n'
+        )
+
+    print(f"AOT (tfcompile) artifacts written to: {aot_dir}")
+
+def create_and_convert(dev_mode=False):
+    # dev_mode=True skips the SavedModel disk roundtrip and converts
+    # straight from the in-memory concrete functions — faster iteration
+    # when tweaking the architecture. The release path (default) still
+    # writes the SavedModel, since that is itself a shipped artifact.
+    os.makedirs("saved_models", exist_ok=True)
+
+    model = TrainableModel()
+
+    if dev_mode:
+        quant_source = [model.infer.get_concrete_function()]
+        saved_model_path = None
+    else:
+        # 1. Save as SavedModel
+        saved_model_path = "saved_models/trainable_micro"
+        tf.saved_model.save(
+            model,
+            saved_model_path,
+            signatures={
+                'train': model.train,
+                'infer': model.infer,
+                'infer_single': model.infer_single, # Rank-1 GEMV path (single sample)
+                'infer_bs1': model.infer_bs1,   # Static batch 1 (on-device inference)
+                'train_bs32': model.train_bs32, # Static batch 32 (on-device fine-tuning)
+                'save': model.save,
+            }
+        )
+        print(f"SavedModel created at: {saved_model_path}")
+
+        # Frozen graph + tf2xla config for the out-of-band tfcompile AOT build
+        export_aot_artifacts(model)
+
+        quant_source = saved_model_path
+
+    def build_trainable_converter(supported_ops):
+        # A converter whose convert() has failed is left in a consumed
+        # state and cannot be retried, so every attempt needs a freshly
+        # built instance (the concrete functions are re-fetched here for
+        # the same reason).
+        if dev_mode:
+            c = tf.lite.TFLiteConverter.from_concrete_functions(
+                [
+                    model.train.get_concrete_function(),
+                    model.infer.get_concrete_function(),
+                    model.save.get_concrete_function(),
+                ],
+                model
+            )
+        else:
+            c = tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
+        c.target_spec.supported_ops = supported_ops
+        c.experimental_enable_resource_variables = True
+        return c
+
     # 2. Convert to TFLite
-    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
-    converter.target_spec.supported_ops = [
-        tf.lite.OpsSet.TFLITE_BUILTINS,  
-        tf.lite.OpsSet.SELECT_TF_OPS 
-    ]
-    converter.experimental_enable_resource_variables = True
-    
-    tflite_model = converter.convert()
-    
+    # Builtins-only keeps the Flex (Select TF ops) runtime — ~6 MB of app
+    # binary plus slower op dispatch — out of the build. The forward pass
+    # is pure matmul/add/relu/sigmoid builtins; only if the train
+    # signature's gradient ops fail to lower on this TF version do we
+    # fall back to SELECT_TF_OPS, printing the offending ops.
+    try:
+        tflite_model = build_trainable_converter([
+            tf.lite.OpsSet.TFLITE_BUILTINS
+        ]).convert()
+    except Exception as e:
+        print(f"Builtins-only conversion failed, retrying with Flex fallback:\n{e}")
+        tflite_model = build_trainable_converter([
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+            tf.lite.OpsSet.SELECT_TF_OPS
+        ]).convert()
+
     tflite_path = "saved_models/trainable_micro_model.tflite"
     with open(tflite_path, "wb") as f:
         f.write(tflite_model)
-        
+
     print(f"TFLite (Trainable) Model saved to: {tflite_path}")
 
+    # 3. Convert an int8 (full-integer) variant for inference
+    # Post-training quantization shrinks the weights 4x and lets the Dense
+    # layers run on int8 GEMV kernels on-device, which matters because these
+    # tiny MLPs are memory-bandwidth bound rather than compute bound.
+    # The 'train' signature must stay FP32 (int8 gradients aren't supported),
+    # so the trainable export above keeps the float weights and only 'infer'
+    # goes into the quantized model.
+    def representative_data_gen():
+        # Features are normalized 0-1 on-device, so uniform samples over that
+        # range are a reasonable calibration proxy (~100 samples).
+        for _ in range(100):
+            yield [np.random.rand(1, INPUT_DIM).astype(np.float32)]
+
+    if dev_mode:
+        quant_converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            quant_source,
+            model
+        )
+    else:
+        quant_converter = tf.lite.TFLiteConverter.from_saved_model(
+            quant_source,
+            signature_keys=['infer']
+        )
+    quant_converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    quant_converter.representative_dataset = representative_data_gen
+    quant_converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    quant_converter.inference_input_type = tf.int8
+    quant_converter.inference_output_type = tf.int8
+
+    quant_tflite_model = quant_converter.convert()
+
+    quant_tflite_path = "saved_models/trainable_micro_model_int8.tflite"
+    with open(quant_tflite_path, "wb") as f:
+        f.write(quant_tflite_model)
+
+    print(f"TFLite (Quantized int8 Inference) Model saved to: {quant_tflite_path}")
+
+    # 4. Dynamic-range (weight-only int8) variant for inference
+    # infer dominates request volume while train runs per-sample SGD, so
+    # quantizing only the inference weights pays off without risking the
+    # training path. Dynamic-range needs no representative dataset: the
+    # ~10k weight floats shrink 4x and TFLite dispatches int8 GEMV kernels
+    # (VNNI / sdot) while activations stay float, sidestepping the
+    # calibration sensitivity of the full-integer variant above.
+    if dev_mode:
+        dyn_converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            quant_source,
+            model
+        )
+    else:
+        dyn_converter = tf.lite.TFLiteConverter.from_saved_model(
+            quant_source,
+            signature_keys=['infer']
+        )
+    dyn_converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    dyn_tflite_path = "saved_models/trainable_micro_infer_dynamic.tflite"
+    with open(dyn_tflite_path, "wb") as f:
+        f.write(dyn_converter.convert())
+
+    print(f"TFLite (Dynamic-Range int8 Inference) Model saved to: {dyn_tflite_path}")
+
 if __name__ == "__main__":
     try:
         if not os.path.exists("saved_models"):